@@ -1,6 +1,9 @@
 # ----------------- IMPORTS (os must be imported before os.getenv) -----------------
 import os
 import io
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 import streamlit as st
 from dotenv import load_dotenv
@@ -32,7 +35,7 @@ if not os.getenv("SCORECARD_API_KEY"):
     st.stop()
 
 # ----------------- PROJECT IMPORTS (after key is set) -----------------
-from src.scorecard_api import ScorecardClient
+from src.scorecard_api import POOL_SIZE, ScorecardClient
 # Try to import optional broadened search helpers; fall back safely if not present.
 try:
     from src.cip_map import CIP_MAP, CIP_BUNDLES, TITLE_SYNONYMS
@@ -40,63 +43,95 @@ except Exception:
     from src.cip_map import CIP_MAP
     CIP_BUNDLES, TITLE_SYNONYMS = {}, {}
 
-from src.lor_sop_nlp import score_document
-from src.acceptance import acceptance_probability
-from src.utils import USD, safe
+from src.acceptance import acceptance_probability_batch
+from src.utils import USD
+
+# Scorecard fields used to build the results table
+RESULT_TEXT_FIELDS = ["school.name", "school.city", "school.state", "school.school_url"]
+RESULT_NUMERIC_FIELDS = [
+    "latest.admissions.admission_rate.overall",
+    "latest.cost.tuition.in_state",
+    "latest.cost.tuition.out_of_state",
+    "latest.cost.roomboard.oncampus",
+    "latest.cost.other_on_campus",
+    "latest.cost.booksupply",
+]
+
+# Display formats for the results table; the DataFrame itself stays numeric (and is what the CSV exports).
+# Missing values are NaN and render as "—".
+MONEY_COLUMNS = ["Tuition (yr)", "Living (yr)", "Books (yr)", "Total (yr)", "Total (2y)"]
+PERCENT_COLUMNS = ["Baseline admit %", "Your admit %"]
 
 # ----------------- BROADENED SEARCH HELPERS -----------------
+# One worker per pooled connection on the client's session
+MAX_FETCH_WORKERS = POOL_SIZE
+# broaden_search stops as soon as it has this many distinct institutions
+MIN_RESULTS = 20
+
+def fetch_pages(client, param_dicts):
+    """Run client.search for each param dict concurrently; results are concatenated in submission order."""
+    if not param_dicts:
+        return []
+    with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(param_dicts))) as executor:
+        pages = executor.map(lambda p: client.search(**p), param_dicts)
+        return [r for data in pages for r in data.get("results", [])]
+
 def _dedup_results(rows):
-    """Deduplicate results by (school.name, state)."""
-    seen = set()
-    out = []
+    """Deduplicate results by (school.name, state), keeping the first occurrence."""
+    out = {}
     for r in rows:
-        key = (r.get("school.name"), r.get("school.state"))
-        if key not in seen:
-            seen.add(key)
-            out.append(r)
-    return out
+        out.setdefault((r.get("school.name"), r.get("school.state")), r)
+    return list(out.values())
 
-def broaden_search(client, *, state, city, zip_radius, course, first_results, cip4, max_pages=3):
+def broaden_search(client, *, state, city, zip_radius, course, course_key, first_results, cip4, max_pages=3):
     """
     If initial results are sparse, try:
       1) Related CIP bundle for the course (if defined)
       2) Title 'contains' synonyms (broadest)
+    course_key is the casefolded course name used for CIP_MAP / CIP_BUNDLES / TITLE_SYNONYMS lookups.
     """
-    if len(first_results) >= 20:
-        return first_results
+    # Gate every stage on the deduplicated count (pages can repeat institutions)
+    all_rows = _dedup_results(first_results)
+    if len(all_rows) >= MIN_RESULTS:
+        return all_rows
 
-    all_rows = list(first_results)
-    key = (course or "").strip().lower()
+    loc = dict(state=state, city=city, zip_radius=zip_radius)
 
-    # 1) CIP bundle candidates (skip the CIP we already used)
+    # 1) CIP bundle candidates (skip the CIP we already used).
+    # All pages are requested up front in parallel; empty trailing pages are cheap.
     cip_candidates = []
-    if key in CIP_BUNDLES:
-        cip_candidates = [c for c in CIP_BUNDLES[key] if c != cip4]
-
-    for c in cip_candidates:
-        for page in range(max_pages):
-            data = client.search(state=state, city=city, zip_radius=zip_radius, cip4=c, page=page)
-            rs = data.get("results", [])
-            all_rows.extend(rs)
-            if len(rs) < 100:
-                break
-
-    all_rows = _dedup_results(all_rows)
-    if len(all_rows) >= 20:
-        return all_rows
+    if course_key in CIP_BUNDLES:
+        cip_candidates = [c for c in CIP_BUNDLES[course_key] if c != cip4]
+
+    if cip_candidates:
+        all_rows.extend(fetch_pages(client, [
+            dict(loc, cip4=c, page=page) for c in cip_candidates for page in range(max_pages)
+        ]))
+        all_rows = _dedup_results(all_rows)
+        if len(all_rows) >= MIN_RESULTS:
+            return all_rows
 
     # 2) Title synonyms (broadest)
-    synonyms = TITLE_SYNONYMS.get(key, [course]) if course else []
-    for kw in synonyms:
-        for page in range(max_pages):
-            data = client.search(state=state, city=city, zip_radius=zip_radius, title_contains=kw, page=page)
-            rs = data.get("results", [])
-            all_rows.extend(rs)
-            if len(rs) < 100:
-                break
+    synonyms = TITLE_SYNONYMS.get(course_key, [course]) if course else []
+    all_rows.extend(fetch_pages(client, [
+        dict(loc, title_contains=kw, page=page) for kw in synonyms for page in range(max_pages)
+    ]))
 
     return _dedup_results(all_rows)
 
+@st.cache_resource(show_spinner=False)
+def get_client():
+    """One ScorecardClient (and pooled session) shared by all reruns and sessions."""
+    return ScorecardClient()
+
+# ----------------- LOR/SOP SCORING -----------------
+@st.cache_data(show_spinner="Scoring document…")
+def _cached_score(sha, name, kind, _bytes):
+    """Score an uploaded document once per content hash; _bytes is excluded from Streamlit's cache key."""
+    # Imported lazily: the NLP stack (torch, pdf parsers) is only needed once a document is uploaded
+    from src.lor_sop_nlp import score_document
+    return score_document(_bytes, name, kind_hint=kind)
+
 # ----------------- UI -----------------
 st.title("🎓 US University Recommender – Real Data + NLP")
 
@@ -146,17 +181,16 @@ with colR:
 
 # ----------------- SEARCH & RESULTS -----------------
 if st.session_state.get("go"):
-    client = ScorecardClient()
+    client = get_client()
 
     # Initial fetch (exact CIP if known, else title search)
-    key = (course or "").strip().lower()
+    key = (course or "").strip().casefold()
     cip4 = CIP_MAP.get(key)
     title_contains = None if cip4 else course
     zip_radius = (zipc, radius) if (zipc and radius) else None
 
-    results = []
-    for page in range(0, 3):
-        data = client.search(
+    results = fetch_pages(client, [
+        dict(
             state=state,
             city=city,
             zip_radius=zip_radius,
@@ -164,10 +198,8 @@ if st.session_state.get("go"):
             title_contains=title_contains,
             page=page,
         )
-        rs = data.get("results", [])
-        results.extend(rs)
-        if len(rs) < 100:
-            break
+        for page in range(0, 3)
+    ])
 
     # Broaden if too few (related CIPs + title synonyms)
     results = broaden_search(
@@ -176,6 +208,7 @@ if st.session_state.get("go"):
         city=city,
         zip_radius=zip_radius,
         course=course,
+        course_key=key,
         first_results=results,
         cip4=cip4,
         max_pages=3,
@@ -190,65 +223,53 @@ if st.session_state.get("go"):
     lor_details = {}
     if upload is not None:
         bytes_data = upload.read()
-        lor_score, lor_details = score_document(bytes_data, upload.name, kind_hint=lor_sop_kind.lower())
-
-    # Build table
-    rows = []
-    for r in results:
-        name_ = safe(r.get("school.name"), "")
-        city_ = safe(r.get("school.city"), "")
-        state_ = safe(r.get("school.state"), "")
-        url_ = safe(r.get("school.school_url"), "")
-
-        base_rate = r.get("latest.admissions.admission_rate.overall")
-        in_tuition = r.get("latest.cost.tuition.in_state") or 0
-        out_tuition = r.get("latest.cost.tuition.out_of_state") or 0
-        room = r.get("latest.cost.roomboard.oncampus") or 0
-        other = r.get("latest.cost.other_on_campus") or 0
-        books = r.get("latest.cost.booksupply") or 0
-
-        tuition = out_tuition if out_tuition else in_tuition
-        living = (room or 0) + (other or 0)
-        per_year = (tuition or 0) + living
-        two_year = 2 * per_year
-        meets_budget = two_year <= budget
-
-        acc = acceptance_probability(
-            base_rate, cgpa=cgpa, gre=(gre or None), ielts=(ielts or None), lor_sop=lor_score
+        lor_score, lor_details = _cached_score(
+            hashlib.sha256(bytes_data).hexdigest(), upload.name, lor_sop_kind.lower(), bytes_data
         )
 
-        rows.append(
-            {
-                "Institution": name_,
-                "City": city_,
-                "State": state_,
-                "URL": url_,
-                "Tuition (yr)": tuition,
-                "Living (yr)": living,
-                "Books (yr)": books,
-                "Total (yr)": per_year,
-                "Total (2y)": two_year,
-                "Baseline admit": base_rate,
-                "Your admit %": round(100 * acc, 1),
-                "Within budget?": "✅" if meets_budget else "—",
-            }
-        )
+    # Build table (column-wise over the whole result set)
+    raw = pd.DataFrame(results).reindex(columns=RESULT_TEXT_FIELDS + RESULT_NUMERIC_FIELDS)
+    text = raw[RESULT_TEXT_FIELDS].fillna("")
+    num = raw[RESULT_NUMERIC_FIELDS].apply(pd.to_numeric, errors="coerce")
+
+    base_rate = num["latest.admissions.admission_rate.overall"]
+    in_tuition = num["latest.cost.tuition.in_state"].fillna(0)
+    out_tuition = num["latest.cost.tuition.out_of_state"].fillna(0)
+    books = num["latest.cost.booksupply"].fillna(0)
+
+    tuition = out_tuition.where(out_tuition > 0, in_tuition)
+    living = num["latest.cost.roomboard.oncampus"].fillna(0) + num["latest.cost.other_on_campus"].fillna(0)
+    per_year = tuition + living
+    two_year = 2 * per_year
 
-    df = pd.DataFrame(rows)
+    acc = acceptance_probability_batch(
+        base_rate.to_numpy(), cgpa=cgpa, gre=(gre or None), ielts=(ielts or None), lor_sop=lor_score
+    )
+
+    df = pd.DataFrame(
+        {
+            "Institution": text["school.name"],
+            "City": text["school.city"],
+            "State": text["school.state"],
+            "URL": text["school.school_url"],
+            # 0 means "no data" for these fields: keep it NaN so it shows as missing, not free
+            "Tuition (yr)": tuition.where(tuition > 0),
+            "Living (yr)": living.where(living > 0),
+            "Books (yr)": books.where(books > 0),
+            "Total (yr)": per_year.where(per_year > 0),
+            "Total (2y)": two_year.where(two_year > 0),
+            "Baseline admit %": (100 * base_rate).round(1),
+            "Your admit %": np.round(100 * acc, 1),
+            "Within budget?": np.where(two_year <= budget, "✅", "—"),
+        }
+    )
     df.sort_values(["Within budget?", "Total (2y)", "Your admit %"], ascending=[False, True, False], inplace=True)
 
     st.subheader("Results")
     st.dataframe(
-        df.assign(
-            **{
-                "Tuition (yr)": df["Tuition (yr)"].map(lambda x: USD.format(x) if x else "—"),
-                "Living (yr)": df["Living (yr)"].map(lambda x: USD.format(x) if x else "—"),
-                "Books (yr)": df["Books (yr)"].map(lambda x: USD.format(x) if x else "—"),
-                "Total (yr)": df["Total (yr)"].map(lambda x: USD.format(x) if x else "—"),
-                "Total (2y)": df["Total (2y)"].map(lambda x: USD.format(x) if x else "—"),
-                "Baseline admit": df["Baseline admit"].map(lambda x: f"{x*100:.1f}%" if x else "—"),
-            }
-        ),
+        df.style
+        .format(USD, na_rep="—", subset=MONEY_COLUMNS)
+        .format("{:.1f}%", na_rep="—", subset=PERCENT_COLUMNS),
         use_container_width=True,
         height=520,
     )
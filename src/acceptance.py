@@ -1,11 +1,21 @@
 from __future__ import annotations
-from typing import Optional
+from functools import lru_cache
+from typing import Callable, NamedTuple, Optional
+import numpy as np
 from .utils import clamp, logit, inv_logit
 
 # Personalized acceptance probability by anchoring on baseline admission rate
 # and shifting the log-odds by profile match (GPA, GRE, IELTS, LOR/SOP). Heuristic.
 
-def normalize_scores(cgpa: float, gre: Optional[float], ielts: Optional[float], lor_sop: float) -> dict:
+class NormalizedScores(NamedTuple):
+    gpa: float
+    gre: Optional[float]
+    ielts: Optional[float]
+    lor: float
+
+# Profile inputs repeat across reruns; the result is immutable so the cached value is safe to share.
+@lru_cache(maxsize=64)
+def normalize_scores(cgpa: float, gre: Optional[float], ielts: Optional[float], lor_sop: float) -> NormalizedScores:
     gpa = clamp((cgpa - 2.5)/(4.0-2.5), 0, 1)
     gre_n = None
     if gre is not None and gre > 0:
@@ -15,31 +25,56 @@ def normalize_scores(cgpa: float, gre: Optional[float], ielts: Optional[float],
     if ielts is not None and ielts > 0:
         ielts_n = clamp((ielts - 5.5)/(9.0-5.5), 0, 1)
     lor_n = clamp(lor_sop, 0, 1)
-    return {"gpa": gpa, "gre": gre_n, "ielts": ielts_n, "lor": lor_n}
-
-def acceptance_probability(baseline_rate: Optional[float], cgpa: float, gre: Optional[float], ielts: Optional[float], lor_sop: float) -> float:
-    base = baseline_rate if baseline_rate is not None else 0.5
-    base = clamp(base, 0.02, 0.98)
-
-    n = normalize_scores(cgpa, gre, ielts, lor_sop)
+    return NormalizedScores(gpa=gpa, gre=gre_n, ielts=ielts_n, lor=lor_n)
 
+def _profile_match(n: NormalizedScores) -> Optional[float]:
     # weights: GPA 0.4, GRE 0.35, IELTS 0.15, LOR/SOP 0.10 (missing values drop and renormalize)
     feats = []
     weights = []
-    if n["gpa"] is not None:
-        feats.append(n["gpa"]); weights.append(0.4)
-    if n["gre"] is not None:
-        feats.append(n["gre"]); weights.append(0.35)
-    if n["ielts"] is not None:
-        feats.append(n["ielts"]); weights.append(0.15)
-    if n["lor"] is not None:
-        feats.append(n["lor"]); weights.append(0.10)
+    if n.gpa is not None:
+        feats.append(n.gpa); weights.append(0.4)
+    if n.gre is not None:
+        feats.append(n.gre); weights.append(0.35)
+    if n.ielts is not None:
+        feats.append(n.ielts); weights.append(0.15)
+    if n.lor is not None:
+        feats.append(n.lor); weights.append(0.10)
     if not feats:
-        return base
+        return None
     wsum = sum(weights)
-    match = sum(f*w for f, w in zip(feats, weights))/wsum
+    return sum(f*w for f, w in zip(feats, weights))/wsum
+
+# logit shift around baseline; beta controls sensitivity
+BETA = 1.6
+
+def _profile_offset(cgpa: float, gre: Optional[float], ielts: Optional[float], lor_sop: float) -> Optional[float]:
+    # log-odds shift for a profile; None when there are no features to match on
+    match = _profile_match(normalize_scores(cgpa, gre, ielts, lor_sop))
+    return None if match is None else BETA*(match - 0.5)
+
+def make_acceptance_fn(cgpa: float, gre: Optional[float], ielts: Optional[float], lor_sop: float) -> Callable[[Optional[float]], float]:
+    """Return baseline_rate -> probability for one profile, with the profile terms computed once up front."""
+    offset = _profile_offset(cgpa, gre, ielts, lor_sop)
+
+    def acceptance(baseline_rate: Optional[float]) -> float:
+        base = clamp(baseline_rate if baseline_rate is not None else 0.5, 0.02, 0.98)
+        if offset is None:
+            return base
+        return float(clamp(inv_logit(logit(base) + offset), 0.01, 0.99))
+
+    return acceptance
+
+def acceptance_probability(baseline_rate: Optional[float], cgpa: float, gre: Optional[float], ielts: Optional[float], lor_sop: float) -> float:
+    return make_acceptance_fn(cgpa, gre, ielts, lor_sop)(baseline_rate)
+
+def acceptance_probability_batch(base_rates: np.ndarray, cgpa: float, gre: Optional[float], ielts: Optional[float], lor_sop: float) -> np.ndarray:
+    """Vectorized acceptance_probability over an array of baseline rates (NaN = unknown) for one profile."""
+    base = np.clip(np.nan_to_num(np.asarray(base_rates, dtype=float), nan=0.5), 0.02, 0.98)
+
+    # The profile is shared by every row, so its log-odds offset is computed once.
+    offset = _profile_offset(cgpa, gre, ielts, lor_sop)
+    if offset is None:
+        return base
 
-    # logit shift around baseline; beta controls sensitivity
-    beta = 1.6
-    z = logit(base) + beta*(match - 0.5)
-    return float(clamp(inv_logit(z), 0.01, 0.99))
+    z = np.log(base/(1-base)) + offset
+    return np.clip(1/(1+np.exp(-z)), 0.01, 0.99)
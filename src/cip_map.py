@@ -1,6 +1,8 @@
+from types import MappingProxyType
+
 # Common program names → CIP 4-digit codes (as integers without the dot)
 # Data Science (30.70 → 3070), Data Analytics (30.71 → 3071), Computer Science (11.07 → 1107), etc.
-CIP_MAP = {
+_CIP_MAP = {
     # Data & AI
     "data science": 3070,      # 30.70 Data Science
     "data analytics": 3071,    # 30.71 Data Analytics
@@ -17,3 +19,6 @@ CIP_MAP = {
     # Business (example mapping; expand as needed)
     "information systems (business)": 5203,  # 52.03 Accounting & Comp Related Svcs (approx. bucket)
 }
+
+# Read-only view keyed on casefolded names; callers look up with course.strip().casefold()
+CIP_MAP = MappingProxyType({k.casefold(): v for k, v in _CIP_MAP.items()})
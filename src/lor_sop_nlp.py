@@ -1,50 +1,77 @@
 from __future__ import annotations
 import io, re
 from typing import Tuple
-import pdfplumber
-from pypdf import PdfReader
-from sentence_transformers import SentenceTransformer, util
-import textstat
+import numpy as np
+import streamlit as st
 
-EMBED = None
+_WS_RE = re.compile(r"\s+")
+_SENT_RE = re.compile(r"(?<=[.!?])\s+")
+_WORD_RE = re.compile(r"[A-Za-z']+")
 
 STRONG_LOR_PHRASES = [
     "strongly recommend", "highest recommendation", "without reservation",
     "top percentile", "outstanding", "exceptional", "exemplary",
 ]
 
-def _init_model():
-    global EMBED
-    if EMBED is None:
-        EMBED = SentenceTransformer("all-MiniLM-L6-v2")
+# Single-pass multi-phrase matcher (pyahocorasick); plain substring scans if it's unavailable
+try:
+    import ahocorasick
+    _PHRASE_AC = ahocorasick.Automaton()
+    for _p in STRONG_LOR_PHRASES:
+        _PHRASE_AC.add_word(_p, _p)
+    _PHRASE_AC.make_automaton()
+    del _p
+except ImportError:
+    _PHRASE_AC = None
+
+@st.cache_resource(show_spinner=False)
+def get_embedder():
+    # One shared model instance across reruns and sessions
+    from sentence_transformers import SentenceTransformer  # pulls in torch; import on first use
+    return SentenceTransformer("all-MiniLM-L6-v2")
 
 def extract_text(file_bytes: bytes, filename: str) -> str:
     name = filename.lower()
     if name.endswith(".txt"):
         return file_bytes.decode("utf-8", errors="ignore")
-    # Prefer pdfplumber; fallback to pypdf
+    # Prefer pypdf (much faster); fall back to pdfplumber when it yields little or no text
+    from pypdf import PdfReader
+    pypdf_failed = False
     try:
-        with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-            return "\n".join(page.extract_text() or "" for page in pdf.pages)
-    except Exception:
         reader = PdfReader(io.BytesIO(file_bytes))
-        return "\n".join(page.extract_text() or "" for page in reader.pages)
+        text = "\n".join(page.extract_text() or "" for page in reader.pages)
+    except Exception:
+        pypdf_failed = True
+        text = ""
+    if len(text.strip()) < 50:
+        import pdfplumber  # heavy (pdfminer.six); only loaded when needed
+        try:
+            with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+                plumber_text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+        except Exception:
+            # unreadable by both parsers: surface the error rather than scoring an empty document
+            if pypdf_failed:
+                raise
+            plumber_text = ""
+        # keep a short but valid pypdf result if pdfplumber does no better
+        text = max(text, plumber_text, key=lambda t: len(t.strip()))
+    return text
 
 def _clean(txt: str) -> str:
-    txt = re.sub(r"\s+", " ", txt)
+    txt = _WS_RE.sub(" ", txt)
     return txt.strip()
 
 def _coherence_score(txt: str) -> float:
-    _init_model()
     # Split into sentences naively
-    sents = re.split(r"(?<=[.!?])\s+", txt)
+    sents = _SENT_RE.split(txt)
     sents = [s.strip() for s in sents if len(s.strip()) > 0]
     if len(sents) < 3:
         return 0.4  # too short to judge
-    embs = EMBED.encode(sents, normalize_embeddings=True)
-    sims = [float(util.cos_sim(embs[i], embs[i+1])) for i in range(len(embs)-1)]
+    embs = get_embedder().encode(sents, normalize_embeddings=True, convert_to_numpy=True, batch_size=64)
+    # unit-normalized embeddings: cosine of adjacent sentences is a row-wise dot product
+    sims = np.einsum("ij,ij->i", embs[:-1], embs[1:])
     # coherence favors consistent flow without being repetitive
-    avg = sum(sims)/len(sims)
+    avg = float(sims.mean())
     return max(0.0, min(1.0, (avg + 1)/2))  # map [-1,1] → [0,1]
 
 def _length_score(words: int, kind: str) -> float:
@@ -59,6 +86,7 @@ def _length_score(words: int, kind: str) -> float:
     return 1.0
 
 def _readability_score(txt: str) -> float:
+    import textstat
     try:
         fre = textstat.flesch_reading_ease(txt)
     except Exception:
@@ -72,8 +100,8 @@ def _readability_score(txt: str) -> float:
     diff = abs(fre-50)
     return max(0.0, 1 - diff/80)
 
-def _lex_diversity(txt: str) -> float:
-    words = re.findall(r"[A-Za-z']+", txt.lower())
+def _lex_diversity(words: list[str]) -> float:
+    words = [w.lower() for w in words]
     if len(words) < 50:
         return 0.4
     uniq = len(set(words))
@@ -81,7 +109,11 @@ def _lex_diversity(txt: str) -> float:
 
 def _phrase_boost(txt: str) -> float:
     t = txt.lower()
-    hits = sum(1 for p in STRONG_LOR_PHRASES if p in t)
+    if _PHRASE_AC is not None:
+        # count distinct phrases, as the substring scan does
+        hits = len({p for _, p in _PHRASE_AC.iter(t)})
+    else:
+        hits = sum(1 for p in STRONG_LOR_PHRASES if p in t)
     return min(0.1 * hits, 0.3)  # at most +0.3
 
 def score_document(file_bytes: bytes, filename: str, kind_hint: str | None = None) -> Tuple[float, dict]:
@@ -90,13 +122,14 @@ def score_document(file_bytes: bytes, filename: str, kind_hint: str | None = Non
     """
     raw = extract_text(file_bytes, filename)
     txt = _clean(raw)
-    words = len(re.findall(r"[A-Za-z']+", txt))
+    tokens = _WORD_RE.findall(txt)
+    words = len(tokens)
     kind = kind_hint or ("lor" if any(w in txt.lower() for w in ["recommend", "reference"]) else "sop")
 
     sc_len = _length_score(words, kind)
     sc_coh = _coherence_score(txt)
     sc_read = _readability_score(txt)
-    sc_lex = _lex_diversity(txt)
+    sc_lex = _lex_diversity(tokens)
     boost = _phrase_boost(txt) if kind == "lor" else 0.0
 
     # weights sum to 1, plus small boost
@@ -1,13 +1,17 @@
 import os, requests
+import orjson
 from typing import Dict, Any, List, Tuple
+import streamlit as st
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 load_dotenv()
 API_KEY = os.getenv("SCORECARD_API_KEY")
 BASE = "https://api.data.gov/ed/collegescorecard/v1/schools"
 
 # Fields we need. Using "latest" keeps it current automatically.
-FIELDS = [
+CORE_FIELDS = [
     "id",
     "school.name",
     "school.city",
@@ -23,29 +27,52 @@ FIELDS = [
     "latest.cost.roomboard.oncampus",
     "latest.cost.other_on_campus",
     "latest.cost.booksupply",
-    # Programs (4-digit CIP) – returns arrays when present
+]
+
+# Programs (4-digit CIP) – returns arrays when present. These dominate the payload,
+# so they are only requested when we must filter by program title client-side.
+PROGRAM_FIELDS = [
     "latest.programs.cip_4_digit.code",
     "latest.programs.cip_4_digit.title",
     "latest.programs.cip_4_digit.credential.level",
 ]
 
 DEFAULT_PER_PAGE = 100
+# Connections kept per session; app.py sizes its fetch thread pool from this
+POOL_SIZE = 8
+
+# Shared by all sessions; bounded so a multi-user deployment can't grow the cache without limit
+CACHE_MAX_ENTRIES = 500
+
+@st.cache_data(ttl=86400, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _cached_get(params_key: Tuple[Tuple[str, Any], ...], _api_key: str, _session: requests.Session) -> Dict[str, Any]:
+    # Keyed on the query params only; leading underscores keep the API key and session out of the cache hash.
+    params = {"api_key": _api_key, **dict(params_key)}
+    r = _session.get(BASE, params=params, timeout=30)
+    r.raise_for_status()
+    # orjson parses the raw bytes directly (no text decode) and is much faster than stdlib json on these payloads
+    return orjson.loads(r.content)
 
 class ScorecardClient:
     def __init__(self, api_key: str | None = None):
         self.api_key = api_key or API_KEY
         if not self.api_key:
             raise RuntimeError("Missing SCORECARD_API_KEY in environment")
+        # Shared across pages/threads so keep-alive reuses the TLS connection
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=POOL_SIZE,
+            pool_maxsize=POOL_SIZE,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 502, 503, 504], raise_on_status=False),
+        )
+        self.session.mount("https://", adapter)
 
     def _get(self, params: Dict[str, Any]) -> Dict[str, Any]:
         params = {
-            "api_key": self.api_key,
             "per_page": params.pop("per_page", DEFAULT_PER_PAGE),
             **params,
         }
-        r = requests.get(BASE, params=params, timeout=30)
-        r.raise_for_status()
-        return r.json()
+        return _cached_get(tuple(sorted(params.items())), self.api_key, self.session)
 
     def search(
         self,
@@ -58,11 +85,13 @@ class ScorecardClient:
         page: int = 0,
     ) -> Dict[str, Any]:
         """Search institutions. If CIP code is provided, we filter server‑side; otherwise we pull and filter
-        client‑side by program title contains."
+        client‑side by program title contains (skipped when cip4 is also given).
         """
+        # A CIP filter already narrows server-side, so the title filter (and its program arrays) is skipped
+        filter_titles = bool(title_contains) and not cip4
         params = {
             "page": page,
-            "fields": ",".join(FIELDS),
+            "fields": ",".join(CORE_FIELDS + PROGRAM_FIELDS if filter_titles else CORE_FIELDS),
         }
         if state:
             params["school.state"] = state.upper()
@@ -77,16 +106,14 @@ class ScorecardClient:
 
         data = self._get(params)
 
-        if title_contains:
-            t = title_contains.lower()
+        if filter_titles:
+            t = title_contains.casefold()
             filtered = []
             for row in data.get("results", []):
-                titles = row.get("latest.programs.cip_4_digit.title", [])
-                if isinstance(titles, list):
-                    match = any(t in str(x).lower() for x in titles)
-                else:
-                    match = t in str(titles).lower()
-                if match:
+                titles = row.get("latest.programs.cip_4_digit.title") or []
+                if not isinstance(titles, list):
+                    titles = [titles]
+                if any(t in str(x).casefold() for x in titles):
                     filtered.append(row)
             data["results"] = filtered
         return data